@@ -10,6 +10,10 @@ from dataclasses import dataclass
 # Default data file location
 DEFAULT_MATERIALS_DATA = Path(__file__).parent.parent.parent / "data" / "materials" / "raw_materials.json"
 
+# CAS registry number shape (e.g. "78-70-6"); compiled once so queries can
+# skip name normalization when they are plainly CAS lookups
+_CAS_RE = re.compile(r"^\d{2,7}-\d{2}-\d$")
+
 
 @dataclass
 class RawMaterial:
@@ -64,6 +68,7 @@ class MaterialsService:
         self.data_file = data_file or DEFAULT_MATERIALS_DATA
         self._materials: dict[str, RawMaterial] = {}
         self._name_index: dict[str, str] = {}  # normalized name -> CAS
+        self._trigram_index: dict[str, set[str]] = {}  # 3-gram -> CAS numbers
         self._loaded = False
 
     def load(self) -> None:
@@ -84,6 +89,10 @@ class MaterialsService:
             for synonym in material.synonyms:
                 self._index_name(synonym, material.cas_number)
 
+            # Build trigram index for substring search
+            for text in self._searchable_fields(material):
+                self._index_trigrams(text, material.cas_number)
+
         self._loaded = True
 
     def _normalize_name(self, name: str) -> str:
@@ -108,6 +117,20 @@ class MaterialsService:
         if normalized:
             self._name_index[normalized] = cas_number
 
+    @staticmethod
+    def _searchable_fields(material: RawMaterial) -> list[str]:
+        """Lowercased fields a search query is matched against."""
+        return [
+            material.name.lower(),
+            material.inci_name.lower(),
+            material.cas_number,
+        ] + [s.lower() for s in material.synonyms]
+
+    def _index_trigrams(self, text: str, cas_number: str) -> None:
+        """Add all 3-grams of a searchable field to the trigram index."""
+        for i in range(len(text) - 2):
+            self._trigram_index.setdefault(text[i:i + 3], set()).add(cas_number)
+
     def _ensure_loaded(self) -> None:
         """Ensure data is loaded."""
         if not self._loaded:
@@ -135,8 +158,11 @@ class MaterialsService:
             RawMaterial if found, None otherwise.
         """
         self._ensure_loaded()
-        normalized = self._normalize_name(name)
-        cas_number = self._name_index.get(normalized)
+        # Cheap probe first: most queries are already plain lowercase
+        # names, so the full regex normalization only runs on a miss
+        cas_number = self._name_index.get(name.lower().strip())
+        if cas_number is None:
+            cas_number = self._name_index.get(self._normalize_name(name))
         if cas_number:
             return self._materials.get(cas_number)
         return None
@@ -152,8 +178,8 @@ class MaterialsService:
             List of matching materials.
         """
         self._ensure_loaded()
-        query_lower = query.lower().strip()
-        query_normalized = self._normalize_name(query)
+        query = query.strip()
+        query_lower = query.lower()
 
         results = []
         seen_cas = set()
@@ -164,26 +190,41 @@ class MaterialsService:
             results.append(material)
             seen_cas.add(material.cas_number)
 
-        # Exact name match
-        if query_normalized in self._name_index:
-            cas = self._name_index[query_normalized]
-            if cas not in seen_cas:
-                results.append(self._materials[cas])
-                seen_cas.add(cas)
+        # Exact name match — skipped for CAS-shaped queries, which never
+        # normalize to an indexed name
+        if not _CAS_RE.match(query):
+            query_normalized = self._normalize_name(query)
+            if query_normalized in self._name_index:
+                cas = self._name_index[query_normalized]
+                if cas not in seen_cas:
+                    results.append(self._materials[cas])
+                    seen_cas.add(cas)
+
+        # Substring matching: intersect trigram postings to narrow candidates
+        # (any field containing the query contains every trigram of it);
+        # queries shorter than a trigram fall back to a linear scan
+        if len(query_lower) >= 3:
+            postings_lists = [
+                self._trigram_index.get(query_lower[i:i + 3], set())
+                for i in range(len(query_lower) - 2)
+            ]
+            # Intersect rarest trigram first so the working set shrinks
+            # as quickly as possible
+            postings_lists.sort(key=len)
+            candidates = set(postings_lists[0])
+            for postings in postings_lists[1:]:
+                if not candidates:
+                    break
+                candidates.intersection_update(postings)
+            candidate_materials = [self._materials[cas] for cas in sorted(candidates)]
+        else:
+            candidate_materials = self._materials.values()
 
-        # Prefix/contains matching
-        for material in self._materials.values():
+        for material in candidate_materials:
             if material.cas_number in seen_cas:
                 continue
 
-            # Check all searchable fields
-            searchable = [
-                material.name.lower(),
-                material.inci_name.lower(),
-                material.cas_number,
-            ] + [s.lower() for s in material.synonyms]
-
-            for field in searchable:
+            for field in self._searchable_fields(material):
                 if query_lower in field or field.startswith(query_lower):
                     results.append(material)
                     seen_cas.add(material.cas_number)
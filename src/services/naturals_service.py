@@ -6,6 +6,7 @@ restricted substance totals including incidentals.
 """
 
 import json
+from bisect import bisect_left
 from pathlib import Path
 from typing import Optional
 
@@ -28,6 +29,7 @@ class NaturalsService:
         """
         self.data_file = data_file or DEFAULT_NATURALS_DATA
         self._naturals: dict[str, NaturalMaterial] = {}
+        self._sorted_cas: tuple[str, ...] = ()
         self._loaded = False
 
     def load(self) -> None:
@@ -42,6 +44,8 @@ class NaturalsService:
             natural = NaturalMaterial.from_dict(item)
             self._naturals[natural.cas_number] = natural
 
+        # Frozen sorted index for the hot is_natural path
+        self._sorted_cas = tuple(sorted(self._naturals))
         self._loaded = True
 
     def _ensure_loaded(self) -> None:
@@ -70,7 +74,9 @@ class NaturalsService:
         Returns:
             True if CAS is a natural material with composition data.
         """
-        return self.get_natural(cas_number) is not None
+        self._ensure_loaded()
+        i = bisect_left(self._sorted_cas, cas_number)
+        return i < len(self._sorted_cas) and self._sorted_cas[i] == cas_number
 
     def get_all_naturals(self) -> list[NaturalMaterial]:
         """Get all natural materials.
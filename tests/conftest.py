@@ -0,0 +1,16 @@
+"""Shared test fixtures and paths."""
+
+from pathlib import Path
+
+import pytest
+
+
+# Repository data directory, resolved once for the whole test session
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+REGULATORY_DATA_DIR = DATA_DIR / "regulatory"
+
+
+@pytest.fixture(scope="session")
+def regulatory_data_dir() -> Path:
+    """Directory containing regulatory data files."""
+    return REGULATORY_DATA_DIR
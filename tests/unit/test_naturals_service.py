@@ -1,7 +1,6 @@
 """Tests for the naturals service."""
 
 import pytest
-from pathlib import Path
 
 from src.services.naturals_service import NaturalsService
 from src.integrations.aroma_lab import FormulaData, FormulaIngredientData
@@ -21,31 +20,40 @@ class TestNaturalsService:
         naturals = service.get_all_naturals()
         assert len(naturals) > 0
 
-    def test_get_lemon_oil(self, service):
-        """Test getting lemon oil by CAS."""
-        natural = service.get_natural("8008-56-8")
-        assert natural is not None
-        assert natural.name == "Lemon Oil"
-        assert natural.botanical_name == "Citrus limon"
-
-    def test_is_natural_positive(self, service):
-        """Test is_natural for known natural."""
-        assert service.is_natural("8008-56-8")  # Lemon oil
-
-    def test_is_natural_negative(self, service):
-        """Test is_natural for non-natural."""
-        assert not service.is_natural("78-70-6")  # Linalool (isolated)
-
-    def test_get_restricted_constituents(self, service):
+    @pytest.mark.parametrize(
+        "cas,expected_name,botanical,is_natural",
+        [
+            ("8008-56-8", "Lemon Oil", "Citrus limon", True),
+            ("78-70-6", None, None, False),  # Linalool (isolated)
+        ],
+    )
+    def test_natural_lookup(self, service, cas, expected_name, botanical, is_natural):
+        """Test get_natural and is_natural for known and non-natural CAS."""
+        assert service.is_natural(cas) is is_natural
+
+        natural = service.get_natural(cas)
+        if is_natural:
+            assert natural is not None
+            assert natural.name == expected_name
+            assert natural.botanical_name == botanical
+        else:
+            assert natural is None
+
+    @pytest.mark.parametrize(
+        "natural_cas,constituent_cas,name,max_pct",
+        [
+            ("8008-56-8", "5392-40-5", "Citral", 5.0),  # Lemon oil
+        ],
+    )
+    def test_get_restricted_constituents(self, service, natural_cas, constituent_cas, name, max_pct):
         """Test getting restricted constituents from a natural."""
-        natural = service.get_natural("8008-56-8")  # Lemon oil
+        natural = service.get_natural(natural_cas)
         assert natural is not None
 
-        # Lemon oil contains citral and limonene as restricted
-        citral = natural.get_constituent("5392-40-5")
-        assert citral is not None
-        assert citral.name == "Citral"
-        assert citral.max_percentage == 5.0
+        constituent = natural.get_constituent(constituent_cas)
+        assert constituent is not None
+        assert constituent.name == name
+        assert constituent.max_percentage == max_pct
 
     def test_calculate_incidentals_single_natural(self, service):
         """Test calculating incidentals from a single natural."""
@@ -1,7 +1,6 @@
 """Tests for VOC compliance service."""
 
 import pytest
-from pathlib import Path
 from src.models.regulatory import Market, ProductType
 from src.models.voc import VOCRegulation
 from src.services.voc_service import VOCService
@@ -9,12 +8,11 @@ from src.integrations.aroma_lab import FormulaData, FormulaIngredientData
 
 
 @pytest.fixture
-def voc_service():
+def voc_service(regulatory_data_dir):
     """Create VOC service instance."""
-    data_dir = Path(__file__).parent.parent.parent / "data" / "regulatory"
     return VOCService(
-        limits_file=data_dir / "voc_limits.json",
-        ingredients_file=data_dir / "voc_ingredients.json",
+        limits_file=regulatory_data_dir / "voc_limits.json",
+        ingredients_file=regulatory_data_dir / "voc_ingredients.json",
     )
 
 